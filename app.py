@@ -16,21 +16,25 @@ To run:
 
 from __future__ import annotations
 
+import json
 import logging
 from datetime import date
 import os
+import re
 import requests
 
 import boto3
 from dotenv import load_dotenv
 from slack_bolt import App, BoltResponse
 from slack_bolt.error import BoltUnhandledRequestError
+from slack_sdk import WebClient
 import sqlalchemy
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 from urllib.parse import urlparse
 
 from models import DiversaSpot
+from router import CommandRouter
 from blocks import (
     leaderboard_blocks,
     rule_blocks,
@@ -44,7 +48,7 @@ from utils import (
     random_disappointed_greeting,
     get_num_spots_for_user_id,
     get_name_from_user_id,
-    iter_leaderboard,
+    get_leaderboard_page,
     find_rank_by_user_id
 )
 
@@ -52,6 +56,7 @@ S3_BUCKET_URL = "https://diversaspots.s3.us-west-1.amazonaws.com/"
 SEMESTER_ID = POSTGRES_SEMESTER_NAME = S3_BUCKET_FOLDER_NAME = "sp25"
 DIVERSABOT_SLACK_ID = "U05GDL7EXJ7"
 CURRENT_SEMESTER_STRING = "Spring 2025"
+LEADERBOARD_PAGE_SIZE = 10
 
 logging.basicConfig(level=logging.INFO)
 
@@ -59,28 +64,45 @@ logging.basicConfig(level=logging.INFO)
 load_dotenv('.env')
 
 # Slack client initialization
+# SLACK_API_URL and S3_ENDPOINT_URL are only set to point the bot at local stand-ins (see loadtest.py).
 app = App(
     token=os.environ.get('SLACK_BOT_TOKEN'),
     signing_secret=os.environ.get('SLACK_SIGNING_SECRET'),
     raise_error_for_unhandled_request=True,
+    client=WebClient(
+        token=os.environ.get('SLACK_BOT_TOKEN'),
+        base_url=os.environ['SLACK_API_URL'],
+    ) if 'SLACK_API_URL' in os.environ else None,
 )
 
+# Every "diversabot <command>" message is parsed once and dispatched to a single handler.
+router = CommandRouter()
+
 # DB initialization
 engine = sqlalchemy.create_engine(os.environ.get('DATABASE_URL').replace("postgresql://", "cockroachdb://"))
 
 # Initialize S3 Bucket
 s3_client = boto3.client('s3',
+    endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
     aws_access_key_id=os.environ.get('AWS_ACCESS_KEY'),
     aws_secret_access_key=os.environ.get('AWS_SECRET_KEY')
 )
 
-@app.message("ping")
-def message_pong(message, client):
+@router.command("ping")
+def message_pong(message, mentions, client, logger):
     """ Ping. Pong. """
     channel_id = message['channel']
     client.chat_postMessage(channel=channel_id, text="pong")
 
 
+@app.event({
+    "type" : "message",
+    "subtype" : (None, "thread_broadcast")
+})
+def route_command(message, client, logger):
+    """ Dispatches a command message to its handler. Spots (file_share messages) are handled by record_spot. """
+    router.dispatch(message, client, logger)
+
 @app.error
 def handle_errors(error, body, logger):
     """ Handles errors that occur during request servicing. 
@@ -154,8 +176,8 @@ def record_spot(message, client, logger):
         text=reply
     )
 
-@app.message("diversabot flag")
-def flag_spot(message, client, logger):
+@router.command("flag")
+def flag_spot(message, mentions, client, logger):
     flagger = message['user']
     channel_id = message["channel"]
     reply: str
@@ -198,8 +220,8 @@ def flag_spot(message, client, logger):
         text=reply
     )
 
-@app.message("diversabot unflag")
-def unflag_spot(message, client, logger):
+@router.command("unflag")
+def unflag_spot(message, mentions, client, logger):
     flagger = message['user']
     channel_id = message["channel"]
     reply: str
@@ -242,17 +264,61 @@ def unflag_spot(message, client, logger):
         text=reply
     )
 
-@app.message("diversabot leaderboard")
-def post_leaderboard(message, client):
-    """ Outputs leaderboard for the current semester."""
-    channel_id = message["channel"]
+def build_leaderboard_page(
+    semester: str,
+    *,
+    cursor: tuple[int, str] | None = None,
+    backwards: bool = False,
+    rank: int = 1
+) -> list[dict]:
+    """ Builds the leaderboard blocks for the page after (or before, if backwards=True) `cursor`.
+
+    `rank` is the rank of the first row on the page, or of the row at `cursor` if backwards=True.
+    The Previous/Next buttons carry the cursor and rank for the neighbouring pages.
+    """
+    page, has_more = get_leaderboard_page(
+        semester, engine, cursor=cursor, backwards=backwards, page_size=LEADERBOARD_PAGE_SIZE
+    )
+    if not page and cursor is not None:
+        # The board changed since this page was posted (e.g. spots were flagged) and nothing is left
+        # past the cursor. Start over rather than leave a leaderboard without any buttons.
+        return build_leaderboard_page(semester)
+
+    if backwards:
+        # Nothing before this page means it is the first page, even if rows were flagged since the
+        # buttons were rendered and it is now shorter than the page it replaces.
+        rank = rank - len(page) if has_more else 1
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = cursor is not None, has_more
 
     message_text = ""
-    for rank, user_id, num_spots in iter_leaderboard(SEMESTER_ID, engine, limit=10):
+    for offset, (user_id, num_spots) in enumerate(page):
         name = get_name_from_user_id(user_id, app)
-        message_text += f"*#{rank}: {name}* with {num_spots} spots \n"
+        message_text += f"*#{rank + offset}: {name}* with {num_spots} spots \n"
+
+    prev_value = next_value = None
+    if page and has_prev:
+        first_user_id, first_num_spots = page[0]
+        prev_value = json.dumps({"semester": semester, "cursor": [first_num_spots, first_user_id], "rank": rank})
+    if page and has_next:
+        last_user_id, last_num_spots = page[-1]
+        next_value = json.dumps({"semester": semester, "cursor": [last_num_spots, last_user_id], "rank": rank + len(page)})
+
+    return leaderboard_blocks(
+        date.today(),
+        message_text or "No one has been spotted here yet!",
+        CURRENT_SEMESTER_STRING,
+        prev_value,
+        next_value
+    )
 
-    blocks = leaderboard_blocks(date.today(), message_text, CURRENT_SEMESTER_STRING)
+@router.command("leaderboard")
+def post_leaderboard(message, mentions, client, logger):
+    """ Outputs the first page of the leaderboard for the current semester."""
+    channel_id = message["channel"]
+
+    blocks = build_leaderboard_page(SEMESTER_ID)
 
     client.chat_postMessage(
         channel=channel_id,
@@ -261,12 +327,32 @@ def post_leaderboard(message, client):
 
     )
 
-@app.message("diversabot miss")
-def post_miss(message, client):
+@app.action(re.compile("^leaderboard_(prev|next)$"))
+def page_leaderboard(ack, action, body, client):
+    """ Replaces a posted leaderboard with its previous or next page."""
+    ack()
+    page = json.loads(action["value"])
+
+    blocks = build_leaderboard_page(
+        page["semester"],
+        cursor=tuple(page["cursor"]),
+        backwards=action["action_id"] == "leaderboard_prev",
+        rank=page["rank"]
+    )
+
+    client.chat_update(
+        channel=body["channel"]["id"],
+        ts=body["message"]["ts"],
+        blocks=blocks,
+        text="Displaying leaderboard information."
+    )
+
+@router.command("miss")
+def post_miss(message, mentions, client, logger):
     user_id = message["user"]
     channel_id = message["channel"]
     message_ts = message["ts"]
-    tagged_users: list[str] = find_all_mentions(message["text"])
+    tagged_users: list[str] = mentions
 
     if len(tagged_users) == 0:
         message_text = "Please tag someone to use this command!"
@@ -311,8 +397,8 @@ def post_miss(message, client):
             text="Displaying miss information."
         )
 
-@app.message("diversabot stats")
-def post_stats(message, client):
+@router.command("stats")
+def post_stats(message, mentions, client, logger):
     user_id = message["user"]
     channel_id = message["channel"]
 
@@ -356,8 +442,8 @@ def post_stats(message, client):
         text="Displaying personal stat information."
     )
 
-@app.message("diversabot help")
-def post_help(message, client):
+@router.command("help")
+def post_help(message, mentions, client, logger):
     """Post help commands"""
     channel_id = message["channel"]
     blocks = help_blocks()
@@ -367,8 +453,8 @@ def post_help(message, client):
         text="Displaying help information."
     )
 
-@app.message("diversabot rules")
-def post_rules(message, client):
+@router.command("rules")
+def post_rules(message, mentions, client, logger):
     """Post rules"""
     channel_id = message["channel"]
     blocks = rule_blocks()
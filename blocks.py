@@ -1,6 +1,8 @@
 """
 Slack block templates for output UI.
 """
+from __future__ import annotations
+
 from datetime import date
 
 
@@ -63,7 +65,7 @@ def help_blocks():
 			"type": "section",
 			"text": {
 				"type": "mrkdwn",
-				"text": "*🏆 Leaderboard:* If you want to see the top 10 DiversaSpotters, type *diversaspot leaderboard*."
+				"text": "*🏆 Leaderboard:* If you want to see the top DiversaSpotters, type *diversabot leaderboard* and page through the rest with the buttons."
 			}
 		},
         {
@@ -144,7 +146,40 @@ def stat_blocks(date: date, name:str, message_text_1: str, message_text_2: str):
     ]
 
 
-def leaderboard_blocks(date: date, message_text: str, current_semester: str):
+def leaderboard_page_buttons(prev_value: str | None, next_value: str | None):
+    elements = []
+    if prev_value is not None:
+        elements.append({
+            "type": "button",
+            "text": {
+                "type": "plain_text",
+                "text": ":arrow_left: Previous",
+                "emoji": True
+            },
+            "action_id": "leaderboard_prev",
+            "value": prev_value
+        })
+    if next_value is not None:
+        elements.append({
+            "type": "button",
+            "text": {
+                "type": "plain_text",
+                "text": "Next :arrow_right:",
+                "emoji": True
+            },
+            "action_id": "leaderboard_next",
+            "value": next_value
+        })
+    return [{"type": "actions", "elements": elements}] if elements else []
+
+
+def leaderboard_blocks(
+    date: date,
+    message_text: str,
+    current_semester: str,
+    prev_value: str | None = None,
+    next_value: str | None = None
+):
     return [
 		{
 			"type": "header",
@@ -169,6 +204,7 @@ def leaderboard_blocks(date: date, message_text: str, current_semester: str):
 				"text": message_text
 			}
 		},
+        *leaderboard_page_buttons(prev_value, next_value),
         {
 			"type": "context",
 			"elements": [
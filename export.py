@@ -0,0 +1,372 @@
+"""
+Offline analytics for DiversaSpots.
+
+`export` incrementally copies the `diversaspots` table into Parquet files partitioned by
+semester, so end-of-semester analytics never have to query the production DB:
+
+    exports/
+        _watermark.json                     <- newest timestamp exported so far and the files
+                                               that make up the export
+        semester=sp25/part-<time>-<uuid>-0.parquet
+        semester=fa24/part-<time>-<uuid>-0.parquet
+
+Each run only reads spots with a timestamp newer than the watermark and streams them from
+the DB in batches, so the table is never loaded into memory.
+
+Spots do not commit in timestamp order: record_spot inserts a spot under its Slack message
+timestamp only after the image has been uploaded to S3. Each run therefore stops at spots
+older than a safety lag (--lag, 10 minutes by default). Otherwise the watermark could pass a
+spot that commits a moment later, and that spot would never be exported. A spot whose insert
+commits more than the lag after it was posted is still missed; use --full to recover it.
+
+Rows are written to a staging directory first and then moved into place. A run only counts
+once `_watermark.json` has been rewritten to list its files, which happens last and in a
+single rename. `report` only reads listed files, so files left behind by an interrupted run
+are ignored (and removed by the next run) rather than counted twice when their rows are
+exported again. Flags changed after a spot was exported are not picked up; use --full to
+rebuild the export from scratch.
+
+`report` computes per-user counts, tag distributions and activity by hour from the export
+alone. It never connects to the DB.
+
+To run (with the virtual environment activated):
+    python export.py export --out exports
+
+    python export.py report --out exports --semester sp25
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv
+import pyarrow.dataset as ds
+from dotenv import load_dotenv
+import sqlalchemy
+from sqlalchemy import ARRAY, Boolean, String
+
+from models import DiversaSpot
+
+WATERMARK_FILE = "_watermark.json"
+STAGING_DIR = "_staging"
+
+SQL_TO_ARROW_TYPES = {
+    String: pa.string(),
+    Boolean: pa.bool_(),
+}
+
+
+def _arrow_type(sql_type) -> pa.DataType:
+    if isinstance(sql_type, ARRAY):
+        return pa.list_(_arrow_type(sql_type.item_type))
+    return SQL_TO_ARROW_TYPES[type(sql_type)]
+
+
+def spot_schema() -> pa.Schema:
+    """Returns the Arrow schema of an exported spot.
+
+    Mirrors the columns of models.DiversaSpot, plus `spotted_at`, the Slack timestamp as a
+    proper UTC timestamp.
+    """
+    fields = [pa.field(column.name, _arrow_type(column.type)) for column in DiversaSpot.__table__.columns]
+    fields.append(pa.field("spotted_at", pa.timestamp("us", tz="UTC")))
+    return pa.schema(fields)
+
+
+def _read_manifest(out_dir: str) -> dict:
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {"timestamp": None, "files": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_watermark(out_dir: str) -> str | None:
+    """Returns the newest timestamp already exported to out_dir, or None if nothing has been."""
+    return _read_manifest(out_dir)["timestamp"]
+
+
+def committed_files(out_dir: str) -> list[str]:
+    """Returns the Parquet files (relative to out_dir) of every export run that completed."""
+    return _read_manifest(out_dir)["files"]
+
+
+def write_watermark(out_dir: str, timestamp: str, files: list[str]):
+    """Commits an export run by atomically recording its watermark and the full list of files."""
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"timestamp": timestamp, "files": files}, f)
+    os.replace(path + ".tmp", path)
+
+
+def _remove_uncommitted_files(out_dir: str, committed: list[str]):
+    """Removes Parquet files left behind by runs that never committed."""
+    committed = set(committed)
+    for root, dirs, files in os.walk(out_dir):
+        dirs[:] = [name for name in dirs if name.startswith("semester=")]
+        for name in files:
+            rel_path = os.path.relpath(os.path.join(root, name), out_dir)
+            if name.endswith(".parquet") and rel_path not in committed:
+                os.remove(os.path.join(root, name))
+
+
+def iter_spot_batches(
+    engine: sqlalchemy.Engine,
+    schema: pa.Schema,
+    *,
+    after: str | None = None,
+    until: str | None = None,
+    batch_size: int = 10_000
+) -> Iterator[pa.RecordBatch]:
+    """Streams spots newer than `after` and no newer than `until` from the DB as record batches,
+    ordered by timestamp.
+
+    Slack timestamps have a fixed width, so comparing them as strings orders them in time.
+    """
+    columns = [column for column in DiversaSpot.__table__.columns]
+    query = sqlalchemy.select(*columns).order_by(DiversaSpot.timestamp)
+    if after is not None:
+        query = query.where(DiversaSpot.timestamp > after)
+    if until is not None:
+        query = query.where(DiversaSpot.timestamp <= until)
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        for rows in result.partitions():
+            data = {column.name: list(values) for column, values in zip(columns, zip(*rows))}
+            seconds = pc.cast(pa.array(data["timestamp"], pa.string()), pa.float64())
+            micros = pc.cast(pc.round(pc.multiply(seconds, 1_000_000)), pa.int64())
+            data["spotted_at"] = micros.cast(pa.timestamp("us", tz="UTC"))
+            yield pa.RecordBatch.from_pydict(data, schema=schema)
+
+
+def is_export_dir(path: str) -> bool:
+    """Returns whether path is recognisably an export, i.e. safe for --full to replace.
+
+    That is a directory holding a watermark, or holding nothing but semester partitions and
+    leftovers of an interrupted run.
+    """
+    if not os.path.isdir(path):
+        return False
+    entries = os.listdir(path)
+    if WATERMARK_FILE in entries:
+        return True
+    leftovers = {STAGING_DIR, WATERMARK_FILE + ".tmp"}
+    return all(
+        name in leftovers or (name.startswith("semester=") and os.path.isdir(os.path.join(path, name)))
+        for name in entries
+    )
+
+
+def export_spots(
+    engine: sqlalchemy.Engine,
+    out_dir: str,
+    *,
+    full: bool = False,
+    lag: float = 600,
+    batch_size: int = 10_000
+) -> int:
+    """Exports spots newer than the watermark in out_dir and older than `lag` seconds.
+
+    If full=True, rebuilds the export from scratch next to out_dir and only swaps it in once
+    the run succeeded, so a failed rebuild leaves the old export untouched.
+
+    Returns the number of spots exported.
+    """
+    if not full:
+        os.makedirs(out_dir, exist_ok=True)
+        return _export_run(engine, out_dir, lag=lag, batch_size=batch_size)
+
+    if os.path.exists(out_dir) and not is_export_dir(out_dir):
+        raise ValueError(f"Refusing to replace {out_dir}: it does not look like an export directory.")
+
+    out_dir = os.path.abspath(out_dir)
+    parent, name = os.path.split(out_dir)
+    run_id = uuid.uuid4().hex
+    rebuild_dir = os.path.join(parent, f".{name}.rebuild-{run_id}")
+    os.makedirs(rebuild_dir)
+    try:
+        exported = _export_run(engine, rebuild_dir, lag=lag, batch_size=batch_size)
+    except BaseException:
+        shutil.rmtree(rebuild_dir, ignore_errors=True)
+        raise
+
+    if os.path.exists(out_dir):
+        old_dir = os.path.join(parent, f".{name}.old-{run_id}")
+        os.rename(out_dir, old_dir)
+        os.rename(rebuild_dir, out_dir)
+        shutil.rmtree(old_dir)
+    else:
+        os.rename(rebuild_dir, out_dir)
+    return exported
+
+
+def _export_run(engine: sqlalchemy.Engine, out_dir: str, *, lag: float, batch_size: int) -> int:
+    manifest = _read_manifest(out_dir)
+    watermark = manifest["timestamp"]
+    staging_dir = os.path.join(out_dir, STAGING_DIR)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    _remove_uncommitted_files(out_dir, manifest["files"])
+
+    schema = spot_schema()
+    exported = 0
+    newest = watermark
+
+    def track(batches: Iterator[pa.RecordBatch]) -> Iterator[pa.RecordBatch]:
+        nonlocal exported, newest
+        for batch in batches:
+            exported += batch.num_rows
+            if batch.num_rows:
+                newest = batch.column("timestamp")[-1].as_py()
+            yield batch
+
+    run_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex}"
+    until = f"{time.time() - lag:.6f}"
+    batches = track(iter_spot_batches(engine, schema, after=watermark, until=until, batch_size=batch_size))
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(schema, batches),
+        staging_dir,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([schema.field("semester")]), flavor="hive"),
+        basename_template=f"part-{run_id}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+    # Move the new files into place. They only become part of the export once the manifest
+    # listing them is written below; until then report ignores them.
+    new_files = []
+    for root, _, files in os.walk(staging_dir):
+        target_dir = os.path.join(out_dir, os.path.relpath(root, staging_dir))
+        os.makedirs(target_dir, exist_ok=True)
+        for name in files:
+            target = os.path.join(target_dir, name)
+            if os.path.exists(target):
+                raise FileExistsError(f"Refusing to overwrite already exported file {target}")
+            os.replace(os.path.join(root, name), target)
+            new_files.append(os.path.relpath(target, out_dir))
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+    if newest != watermark:
+        write_watermark(out_dir, newest, manifest["files"] + sorted(new_files))
+    return exported
+
+
+def load_spots(out_dir: str, *, semester: str | None = None, include_flagged: bool = False) -> pa.Table:
+    """Loads the committed spots in out_dir. Flagged spots are excluded unless include_flagged=True."""
+    if not os.path.isdir(out_dir):
+        raise FileNotFoundError(out_dir)
+    schema = spot_schema()
+    dataset = ds.dataset(
+        [os.path.join(out_dir, path) for path in committed_files(out_dir)],
+        schema=schema,
+        partition_base_dir=out_dir,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([schema.field("semester")]), flavor="hive"),
+    )
+    condition = None
+    if semester is not None:
+        condition = ds.field("semester") == semester
+    if not include_flagged:
+        not_flagged = ds.field("flagged") != True
+        condition = not_flagged if condition is None else condition & not_flagged
+    return dataset.to_table(filter=condition)
+
+
+def spots_per_user(spots: pa.Table) -> pa.Table:
+    """Returns (user_id, spots, times_spotted) per user, ordered by spots descending."""
+    spotted = spots.group_by("spotter").aggregate([("spotter", "count")]) \
+                   .rename_columns(["user_id", "spots"])
+    tagged = pa.table({"user_id": pc.list_flatten(spots.column("tagged"))}) \
+               .group_by("user_id").aggregate([("user_id", "count")]) \
+               .rename_columns(["user_id", "times_spotted"])
+
+    per_user = spotted.join(tagged, "user_id", join_type="full outer")
+    per_user = per_user.set_column(1, "spots", pc.fill_null(per_user.column("spots"), 0))
+    per_user = per_user.set_column(2, "times_spotted", pc.fill_null(per_user.column("times_spotted"), 0))
+    return per_user.sort_by([("spots", "descending"), ("times_spotted", "descending"), ("user_id", "ascending")])
+
+
+def tag_distribution(spots: pa.Table) -> pa.Table:
+    """Returns how many spots tagged a given number of people, as (num_tagged, spots)."""
+    num_tagged = pc.fill_null(pc.list_value_length(spots.column("tagged")), 0)
+    return pa.table({"num_tagged": num_tagged}) \
+             .group_by("num_tagged").aggregate([("num_tagged", "count")]) \
+             .rename_columns(["num_tagged", "spots"]) \
+             .sort_by("num_tagged")
+
+
+def activity_by_hour(spots: pa.Table, tz: str) -> pa.Table:
+    """Returns the number of spots posted in each hour of the day in timezone `tz`, as (hour, spots)."""
+    local_times = spots.column("spotted_at").cast(pa.timestamp("us", tz=tz))
+    counts = pa.table({"hour": pc.hour(local_times)}) \
+               .group_by("hour").aggregate([("hour", "count")]) \
+               .rename_columns(["hour", "spots"])
+    all_hours = pa.table({"hour": pa.array(range(24), pa.int64())})
+    by_hour = all_hours.join(counts, "hour", join_type="left outer")
+    return by_hour.set_column(1, "spots", pc.fill_null(by_hour.column("spots"), 0)).sort_by("hour")
+
+
+def _print_table(title: str, table: pa.Table, limit: int | None = None):
+    print(f"\n{title}")
+    rows = table.to_pylist()[:limit]
+    widths = [max([len(name)] + [len(str(row[name])) for row in rows]) for name in table.column_names]
+    print("  ".join(name.ljust(width) for name, width in zip(table.column_names, widths)))
+    for row in rows:
+        print("  ".join(str(row[name]).ljust(width) for name, width in zip(table.column_names, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export new spots from the DB to Parquet.")
+    export_parser.add_argument("--out", default="exports", help="Export directory.")
+    export_parser.add_argument("--batch-size", type=int, default=10_000, help="Rows fetched from the DB at a time.")
+    export_parser.add_argument("--full", action="store_true", help="Discard the existing export and start over.")
+    export_parser.add_argument("--lag", type=float, default=600,
+                               help="Only export spots at least this many seconds old, so late commits aren't skipped.")
+
+    report_parser = subparsers.add_parser("report", help="Summarize an export. Never touches the DB.")
+    report_parser.add_argument("--out", default="exports", help="Export directory.")
+    report_parser.add_argument("--semester", default=None, help="Only report on this semester, e.g. sp25.")
+    report_parser.add_argument("--include-flagged", action="store_true", help="Count flagged spots too.")
+    report_parser.add_argument("--timezone", default="America/Los_Angeles", help="Timezone for activity by hour.")
+    report_parser.add_argument("--top", type=int, default=20, help="Number of users to list.")
+    report_parser.add_argument("--csv", default=None, help="Also write every report as CSV into this directory.")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        load_dotenv('.env')
+        engine = sqlalchemy.create_engine(os.environ.get('DATABASE_URL').replace("postgresql://", "cockroachdb://"))
+        exported = export_spots(engine, args.out, full=args.full, lag=args.lag, batch_size=args.batch_size)
+        print(f"Exported {exported} spots to {args.out} (watermark: {read_watermark(args.out)})")
+        return
+
+    spots = load_spots(args.out, semester=args.semester, include_flagged=args.include_flagged)
+    reports = {
+        "spots_per_user": spots_per_user(spots),
+        "tag_distribution": tag_distribution(spots),
+        "activity_by_hour": activity_by_hour(spots, args.timezone),
+    }
+    print(f"{spots.num_rows} spots")
+    _print_table(f"Top {args.top} spotters", reports["spots_per_user"], limit=args.top)
+    _print_table("People tagged per spot", reports["tag_distribution"])
+    _print_table(f"Spots by hour ({args.timezone})", reports["activity_by_hour"])
+
+    if args.csv is not None:
+        os.makedirs(args.csv, exist_ok=True)
+        for name, table in reports.items():
+            pyarrow.csv.write_csv(table, os.path.join(args.csv, f"{name}.csv"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+End-to-end load test for the Slack bot.
+
+Replays a burst of signed Slack events against the real Bolt app in app.py and reports
+throughput, p50/p95/p99 latency per command and the share of events answered within
+Slack's 3-second window.
+
+Everything the bot talks to is replaced by a local stand-in:
+    - the Slack Web API (auth.test, users.info, chat.postMessage, file downloads)
+      is served by an in-process HTTP server that records every reply.
+    - S3 is an in-process HTTP server that accepts and discards every upload.
+    - the DB must be a local, throwaway Postgres-compatible database, e.g. a CockroachDB
+      node started with `cockroach start-single-node --insecure`. The harness creates the
+      `diversaspots` table if needed and only touches rows in the `loadtest` semester.
+
+An event counts as answered once the bot posts its chat.postMessage reply. Every event is
+sent to its own channel, which is how replies are matched back to events. Bolt's development
+server still logs every request to stderr; redirect it with 2>/dev/null for a clean report.
+
+To run (with the virtual environment activated):
+    python loadtest.py --database-url "postgresql://root@localhost:26257/defaultdb?sslmode=disable"
+
+    python loadtest.py --spots 200 --commands 500 --rate 11.7
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from slack_sdk.signature import SignatureVerifier
+
+SIGNING_SECRET = "loadtest-signing-secret"
+TEAM_ID = "T0LOADTEST"
+BOT_USER_ID = "U0LOADBOT"
+LOADTEST_SEMESTER = "loadtest"
+SLACK_ACK_WINDOW = 3.0
+
+# Tiny stand-in for the image the bot downloads from Slack and uploads to S3.
+FAKE_IMAGE = b"\xff\xd8\xff\xe0" + b"\x00" * 2048
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+
+class FakeSlackHandler(_QuietHandler):
+    """Stand-in for the Slack Web API. Records the time of every chat.postMessage per channel."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/files/"):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(FAKE_IMAGE)))
+            self.end_headers()
+            self.wfile.write(FAKE_IMAGE)
+        else:
+            self._handle_api(url.path, {k: v[0] for k, v in parse_qs(url.query).items()})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        raw = self._read_body().decode()
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params = json.loads(raw or "{}")
+        else:
+            params = {k: v[0] for k, v in parse_qs(raw).items()}
+        params.update({k: v[0] for k, v in parse_qs(url.query).items()})
+        self._handle_api(url.path, params)
+
+    def _handle_api(self, path: str, params: dict):
+        method = path.rsplit("/", 1)[-1]
+        if method == "auth.test":
+            self._send_json({
+                "ok": True,
+                "url": "https://loadtest.slack.com/",
+                "team": "loadtest",
+                "team_id": TEAM_ID,
+                "user": "diversabot",
+                "user_id": BOT_USER_ID,
+                "bot_id": "B0LOADBOT",
+            })
+        elif method == "users.info":
+            user_id = params.get("user", "")
+            self._send_json({"ok": True, "user": {"id": user_id, "real_name": f"Load Tester {user_id}"}})
+        elif method == "chat.postMessage":
+            self.server.record_reply(params.get("channel"))
+            self._send_json({"ok": True, "channel": params.get("channel"), "ts": f"{time.time():.6f}"})
+        else:
+            self._send_json({"ok": False, "error": "unknown_method"})
+
+
+class FakeSlackServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, FakeSlackHandler)
+        self._lock = threading.Lock()
+        self.replies: dict[str, float] = {}
+
+    def record_reply(self, channel: str):
+        now = time.perf_counter()
+        with self._lock:
+            # Only the first reply counts towards latency.
+            self.replies.setdefault(channel, now)
+
+
+class FakeS3Handler(_QuietHandler):
+    """Stand-in for S3. Accepts and discards every upload."""
+
+    # boto sends "Expect: 100-continue" on put_object. http.server only answers it over HTTP/1.1;
+    # over HTTP/1.0 every upload stalls for a second before botocore sends the body anyway.
+    protocol_version = "HTTP/1.1"
+
+    def do_PUT(self):
+        self._read_body()
+        self.send_response(200)
+        self.send_header("ETag", '"loadtest"')
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(server: ThreadingHTTPServer) -> str:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return f"http://{host}:{port}"
+
+
+def _wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"Bolt app did not start listening on port {port}")
+
+
+def build_event(command: str, channel: str, user: str, ts: str, tagged: list[str], slack_url: str) -> dict:
+    """Builds an `event_callback` payload as Slack's Events API would deliver it.
+
+    `command` is either "spot" (a file_share message) or the text of a "diversabot ..." message.
+    """
+    event = {
+        "type": "message",
+        "user": user,
+        "ts": ts,
+        "channel": channel,
+        "channel_type": "channel",
+        "event_ts": ts,
+        "team": TEAM_ID,
+    }
+    if command == "spot":
+        event["subtype"] = "file_share"
+        event["text"] = "spotted " + " ".join(f"<@{user_id}>" for user_id in tagged)
+        event["files"] = [{
+            "id": f"F{channel}",
+            "filetype": "jpg",
+            "url_private": f"{slack_url}/files/{user}_{ts}.jpg",
+        }]
+    else:
+        event["text"] = f"diversabot {command}"
+
+    return {
+        "token": "loadtest",
+        "team_id": TEAM_ID,
+        "api_app_id": "A0LOADTEST",
+        "event": event,
+        "type": "event_callback",
+        "event_id": f"Ev{channel}",
+        "event_time": int(float(ts)),
+        "authorizations": [{
+            "team_id": TEAM_ID,
+            "user_id": BOT_USER_ID,
+            "is_bot": True,
+        }],
+    }
+
+
+def sign(body: str, signing_secret: str = SIGNING_SECRET) -> dict[str, str]:
+    """Returns the headers Slack attaches to a request with the given body."""
+    timestamp = str(int(time.time()))
+    return {
+        "Content-Type": "application/json",
+        "X-Slack-Request-Timestamp": timestamp,
+        "X-Slack-Signature": SignatureVerifier(signing_secret).generate_signature(timestamp=timestamp, body=body),
+    }
+
+
+def plan_events(num_spots: int, num_commands: int, num_users: int, seed: int) -> list[tuple[str, str, list[str]]]:
+    """Returns a shuffled list of (command, user, tagged_users)."""
+    rng = random.Random(seed)
+    users = [f"U{i:07d}" for i in range(num_users)]
+    events = [("spot", rng.choice(users), rng.sample(users, k=rng.randint(1, 3))) for _ in range(num_spots)]
+    events += [(rng.choice(["leaderboard", "stats"]), rng.choice(users), []) for _ in range(num_commands)]
+    rng.shuffle(events)
+    return events
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of `values`."""
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def report(results: list[dict], elapsed: float):
+    """Prints per-command throughput and latency."""
+    print(f"\n{len(results)} events in {elapsed:.1f}s")
+    header = f"{'command':<12}{'sent':>6}{'answered':>10}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'<3s':>8}"
+    print(header)
+    print("-" * len(header))
+
+    commands = sorted({result["command"] for result in results})
+    for command in commands + ["all"]:
+        rows = [result for result in results if command in ("all", result["command"])]
+        latencies = [result["latency"] for result in rows if result["latency"] is not None]
+        within_window = sum(1 for latency in latencies if latency <= SLACK_ACK_WINDOW)
+        line = f"{command:<12}{len(rows):>6}{len(latencies):>10}{len(latencies) / elapsed:>8.1f}"
+        if latencies:
+            line += "".join(f"{percentile(latencies, pct) * 1000:>9.0f}" for pct in (50, 95, 99))
+        else:
+            line += f"{'-':>9}" * 3
+        line += f"{within_window / len(rows):>8.1%}"
+        print(line)
+
+    acks = [result["ack"] for result in results if result["ack"] is not None]
+    failed = sum(1 for result in results if result["status"] != 200)
+    if acks:
+        print(f"\nHTTP ack p99: {percentile(acks, 99) * 1000:.0f} ms, non-200 responses: {failed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get(
+        "LOADTEST_DATABASE_URL", "postgresql://root@localhost:26257/defaultdb?sslmode=disable"),
+        help="Local, throwaway Postgres-compatible DB. Never point this at production.")
+    parser.add_argument("--spots", type=int, default=200, help="Number of file_share events.")
+    parser.add_argument("--commands", type=int, default=500, help="Number of leaderboard/stats messages.")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Events per second. Defaults to sending everything over one minute.")
+    parser.add_argument("--users", type=int, default=50, help="Number of distinct simulated Slack users.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum number of in-flight requests.")
+    parser.add_argument("--drain", type=float, default=30.0, help="Seconds to wait for outstanding replies.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Keep the bot's INFO logging.")
+    args = parser.parse_args()
+
+    slack_server = FakeSlackServer(("127.0.0.1", 0))
+    slack_url = _serve(slack_server)
+    s3_url = _serve(ThreadingHTTPServer(("127.0.0.1", 0), FakeS3Handler))
+
+    # app.py reads its configuration at import time, so the stand-ins must be wired up first.
+    os.environ.update({
+        "SLACK_BOT_TOKEN": "xoxb-loadtest",
+        "SLACK_SIGNING_SECRET": SIGNING_SECRET,
+        "SLACK_API_URL": f"{slack_url}/api/",
+        "S3_ENDPOINT_URL": s3_url,
+        "AWS_ACCESS_KEY": "loadtest",
+        "AWS_SECRET_KEY": "loadtest",
+        "AWS_DEFAULT_REGION": "us-west-1",
+        "DATABASE_URL": args.database_url,
+    })
+    import app as bot
+    from models import Base, DiversaSpot
+    from sqlalchemy.orm import Session
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    # Keep load test rows apart from anything else in the DB.
+    bot.SEMESTER_ID = LOADTEST_SEMESTER
+    Base.metadata.create_all(bot.engine)
+    with Session(bot.engine) as session, session.begin():
+        session.query(DiversaSpot).filter(DiversaSpot.semester == LOADTEST_SEMESTER).delete()
+
+    port = _free_port()
+    threading.Thread(target=bot.app.start, kwargs={"port": port}, daemon=True).start()
+    _wait_for_port(port)
+    app_url = f"http://127.0.0.1:{port}/slack/events"
+
+    planned = plan_events(args.spots, args.commands, args.users, args.seed)
+    rate = args.rate or len(planned) / 60
+    base_ts = time.time()
+    results: list[dict] = []
+
+    def send(index: int, command: str, user: str, tagged: list[str], scheduled: float):
+        channel = f"C{index:08d}"
+        body = json.dumps(build_event(command, channel, user, f"{base_ts + index:.6f}", tagged, slack_url))
+        # Latency is measured from when the event was due, not when a worker got to it, so time spent
+        # queued behind a saturated bot still counts (avoids coordinated omission).
+        result = {"command": command, "channel": channel, "sent": scheduled,
+                  "status": None, "ack": None, "latency": None}
+        results.append(result)
+        try:
+            resp = requests.post(app_url, data=body, headers=sign(body), timeout=SLACK_ACK_WINDOW * 5)
+            result["status"] = resp.status_code
+            result["ack"] = time.perf_counter() - result["sent"]
+        except requests.RequestException:
+            pass
+
+    print(f"Sending {len(planned)} events at {rate:.1f} events/s ...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for index, (command, user, tagged) in enumerate(planned):
+            scheduled = start + index / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, index, command, user, tagged, scheduled)
+
+    deadline = time.perf_counter() + args.drain
+    while len(slack_server.replies) < len(planned) and time.perf_counter() < deadline:
+        time.sleep(0.1)
+
+    for result in results:
+        if (replied := slack_server.replies.get(result["channel"])) is not None:
+            result["latency"] = replied - result["sent"]
+    finished = max(slack_server.replies.values(), default=time.perf_counter())
+    report(results, finished - start)
+
+    print("\nHandler time per routed command (count, mean ms, max ms):")
+    for command, (count, mean_ms, max_ms) in sorted(bot.router.stats().items()):
+        print(f"  {command:<12}{count:>6}{mean_ms:>9.0f}{max_ms:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Single-dispatch router for "diversabot <command>" messages.
+
+Every message is parsed once, and at most one handler runs for it. This replaces
+registering one `@app.message(...)` keyword listener per command.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from typing import Callable
+
+from utils import find_all_mentions
+
+# A message is either exactly "ping", or contains "diversabot <command>". Only the first command counts.
+COMMAND_PATTERN = re.compile(r"^\s*(?P<bare>ping)\s*$|\bdiversabot\s+(?P<command>\w+)", re.IGNORECASE)
+
+
+def parse_command(text: str) -> tuple[str, list[str]] | None:
+    """Returns (command, mentioned user_ids) for a message, or None if it isn't a command."""
+    if (match := COMMAND_PATTERN.search(text)) is None:
+        return None
+    command = match.group("bare") or match.group("command")
+    return command.lower(), find_all_mentions(text)
+
+
+class CommandRouter:
+    """Dispatches each command message to exactly one handler through a lookup table.
+
+    Handlers are called as handler(message, mentions, client, logger). The router keeps a
+    per-command count and total/max handler latency.
+    """
+
+    def __init__(self):
+        self._handlers: dict[str, Callable] = {}
+        self._lock = threading.Lock()
+        self._stats: dict[str, tuple[int, float, float]] = {}
+
+    def command(self, name: str):
+        """Registers the decorated function as the handler for `name`."""
+        def register(handler: Callable) -> Callable:
+            self._handlers[name] = handler
+            return handler
+        return register
+
+    def dispatch(self, message: dict, client, logger) -> bool:
+        """Runs the handler for the command in `message`. Returns False if there was none."""
+        parsed = parse_command(message.get("text") or "")
+        if parsed is None:
+            return False
+        command, mentions = parsed
+        if (handler := self._handlers.get(command)) is None:
+            logger.info(f"Unknown command '{command}' from user {message.get('user')}.")
+            return False
+
+        start = time.perf_counter()
+        try:
+            handler(message, mentions, client, logger)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                count, total, longest = self._stats.get(command, (0, 0.0, 0.0))
+                self._stats[command] = (count + 1, total + elapsed, max(longest, elapsed))
+            logger.info(f"Handled '{command}' in {elapsed * 1000:.0f} ms.")
+        return True
+
+    def stats(self) -> dict[str, tuple[int, float, float]]:
+        """Returns {command: (count, mean_ms, max_ms)} for every command handled so far."""
+        with self._lock:
+            return {
+                command: (count, total / count * 1000, longest * 1000)
+                for command, (count, total, longest) in self._stats.items()
+            }
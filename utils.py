@@ -45,7 +45,7 @@ def iter_leaderboard(
                         .filter(DiversaSpot.semester == curr_semester) \
                         .filter(DiversaSpot.flagged != True) \
                         .group_by(DiversaSpot.spotter) \
-                        .order_by(sqlalchemy.func.count(DiversaSpot.spotter).desc()) \
+                        .order_by(sqlalchemy.func.count(DiversaSpot.spotter).desc(), DiversaSpot.spotter) \
                         .all()
     rank = 1
     for user_id, num_spots in leaderboard:
@@ -54,6 +54,57 @@ def iter_leaderboard(
         if limit and rank > limit:
             return
 
+def get_leaderboard_page(
+    curr_semester: str,
+    engine: sqlalchemy.Engine,
+    *,
+    cursor: tuple[int, str] | None = None,
+    backwards: bool = False,
+    page_size: int = 10,
+) -> tuple[list[tuple[str, int]], bool]:
+    """Returns one page of the leaderboard in the form ([(user_id, num_spots), ...], has_more)
+
+    Uses keyset pagination on (num_spots, user_id), ordered by num_spots descending and then
+    user_id ascending, so only `page_size` rows are fetched no matter how deep the page is.
+
+    `cursor` is the (num_spots, user_id) of the row the page starts after, or ends before if
+    backwards=True. If cursor=None, returns the first page. `has_more` denotes whether there are
+    more rows past this page in the direction of travel.
+    """
+    spot_count = sqlalchemy.func.count(DiversaSpot.spotter)
+    with Session(engine) as session:
+        query = session.query(DiversaSpot.spotter, spot_count) \
+                    .filter(DiversaSpot.semester == curr_semester) \
+                    .filter(DiversaSpot.flagged != True) \
+                    .group_by(DiversaSpot.spotter)
+
+        if cursor is not None:
+            num_spots, user_id = cursor
+            if backwards:
+                query = query.having(sqlalchemy.or_(
+                    spot_count > num_spots,
+                    sqlalchemy.and_(spot_count == num_spots, DiversaSpot.spotter < user_id)
+                ))
+            else:
+                query = query.having(sqlalchemy.or_(
+                    spot_count < num_spots,
+                    sqlalchemy.and_(spot_count == num_spots, DiversaSpot.spotter > user_id)
+                ))
+
+        if backwards:
+            query = query.order_by(spot_count.asc(), DiversaSpot.spotter.desc())
+        else:
+            query = query.order_by(spot_count.desc(), DiversaSpot.spotter.asc())
+
+        # Fetch one extra row to find out whether there is another page.
+        rows = query.limit(page_size + 1).all()
+
+    has_more = len(rows) > page_size
+    page = [(user_id, num_spots) for user_id, num_spots in rows[:page_size]]
+    if backwards:
+        page.reverse()
+    return page, has_more
+
 def find_rank_by_user_id(user_id: str, curr_semester: str, engine: sqlalchemy.Engine) -> int:
     """Returns the rank of a user by their user_id"""
     for rank, user_id_, _ in iter_leaderboard(curr_semester, engine):